@@ -10,9 +10,8 @@ import googletrans
 from googletrans import Translator
 import unicodedata
 from src.recipe_generation import configure_gemini, generate_recipe
-from src.pdf_utils import recipe_to_pdf, meal_plan_to_pdf
-from src.translation_utils import translate_text
-from src.nutrition_utils import get_nutritional_analysis
+from src.pdf_utils import recipe_to_pdf, meal_plan_to_pdf, export_history
+from src.prefetch_utils import get_prefetcher, remember_view_language, nutrition_language
 from src.history_utils import load_recipe_history, save_recipe_history
 from src.meal_plan_utils import load_meal_plan_history, save_meal_plan_history, add_meal_plan_to_history
 
@@ -80,6 +79,12 @@ view_languages = {
 view_language = st.selectbox("View Recipe In", list(view_languages.keys()), index=0)
 view_lang_code = view_languages[view_language]
 
+# Background translation/nutrition prefetching for the languages this user views recipes in
+prefetcher = get_prefetcher()
+if 'recent_view_languages' not in st.session_state:
+    st.session_state.recent_view_languages = []
+st.session_state.recent_view_languages = remember_view_language(st.session_state.recent_view_languages, view_lang_code)
+
 # Initialize session state variables
 # Removed: viewing_recipe_id
 if 'current_generated_recipe_text' not in st.session_state:
@@ -150,16 +155,59 @@ with st.sidebar:
 
         submitted = st.form_submit_button("✨ Generate Recipe", type="primary", use_container_width=True)
 
+    if submitted:
+        if not ingredients_input_val.strip():
+            st.warning("⚠️ Please enter at least one ingredient.")
+        elif not invalid_time:
+            with st.spinner("Cooking up your recipe..."):
+                recipe_text = generate_recipe(model, ingredients_input_val, diet_input_val, cuisine_input_val or "Any", meal_type_input_val, skill_level_input_val, total_time_input_val, selected_language)
+            if recipe_text:
+                generated_inputs = {
+                    'ingredients': ingredients_input_val,
+                    'meal_type': meal_type_input_val,
+                    'cuisine': cuisine_input_val,
+                    'diet': diet_input_val,
+                    'skill_level': skill_level_input_val,
+                    'total_time': total_time_input_val,
+                    'language': selected_language
+                }
+                st.session_state.current_generated_recipe_text = recipe_text
+                st.session_state.last_generated_inputs = generated_inputs
+                st.session_state.recipe_history.append({'name': extract_recipe_name(recipe_text), 'text': recipe_text, 'inputs': generated_inputs})
+                save_recipe_history(st.session_state.recipe_history)
+                st.session_state.selected_history_index = None
+                st.session_state.meal_plan_results = None
+                prefetcher.prefetch(model, recipe_text, ingredients_input_val, st.session_state.recent_view_languages)
+
     # --- Recipe History Section with Advanced Filtering and Search ---
     st.markdown("---")
     st.header("📜 Recipe History")
     # --- Clear History Button ---
     if st.button("🗑 Clear All History", key="clear_all_history"):
+        for recipe in st.session_state.recipe_history:
+            prefetcher.cancel(recipe['text'])
         st.session_state.recipe_history = []
         save_recipe_history([])
         st.session_state.selected_history_index = None
         st.success("Recipe history cleared!")
         st.rerun()
+    # --- Bulk Export of the Whole History ---
+    with st.expander("📦 Export All History", expanded=False):
+        export_format = st.radio("Export Format", ["PDF", "ZIP"], horizontal=True, key="history_export_format", help="PDF merges every recipe into one document, ZIP holds one PDF per recipe.")
+        if st.button("Prepare Export", key="prepare_history_export", disabled=not st.session_state.recipe_history):
+            export_ext = export_format.lower()
+            with st.spinner("Rendering recipe history..."):
+                export_file = export_history(st.session_state.recipe_history, fmt=export_ext)
+            if export_file is not None:
+                # download_button keeps the data in memory; the temporary file is deleted on close.
+                with export_file:
+                    st.download_button(
+                        label=f"⬇️ Download History as {export_format}",
+                        data=export_file.read(),
+                        file_name=f"Recipe_History.{export_ext}",
+                        mime="application/zip" if export_ext == "zip" else "application/pdf",
+                        key="download_history_export"
+                    )
     # Filtering/search UI
     with st.expander("🔍 Filter & Search History", expanded=False):
         with st.form("history_filter_form"):
@@ -203,9 +251,11 @@ with st.sidebar:
             with col1:
                 if st.button(label, key=f"history_{display_idx}"):
                     st.session_state.selected_history_index = st.session_state.recipe_history.index(recipe)
+                    prefetcher.prefetch(model, recipe['text'], recipe['inputs']['ingredients'], st.session_state.recent_view_languages)
             with col2:
                 if st.button("🗑️", key=f"delete_{display_idx}"):
                     # Remove the recipe from history
+                    prefetcher.cancel(recipe['text'])
                     del st.session_state.recipe_history[st.session_state.recipe_history.index(recipe)]
                     save_recipe_history(st.session_state.recipe_history)
                     st.session_state.selected_history_index = None
@@ -317,13 +367,13 @@ elif st.session_state.selected_history_index is not None:
         display_text = recipe['text']
         if view_lang_code != "original":
             with st.spinner("Translating..."):
-                display_text = translate_text(recipe['text'], view_lang_code)
+                display_text = prefetcher.translation(recipe['text'], view_lang_code)
         st.markdown(display_text)
         # --- Nutritional Analysis for History ---
         st.markdown("#### 🥗 Nutritional Analysis (AI Estimated)")
-        nutrition_lang = view_lang_code if view_lang_code != "original" else "en"
+        nutrition_lang = nutrition_language(view_lang_code)
         with st.spinner("Analyzing nutrition..."):
-            nutrition = get_nutritional_analysis(model, inputs['ingredients'], language=nutrition_lang)
+            nutrition = prefetcher.nutrition(model, recipe['text'], inputs['ingredients'], nutrition_lang)
         st.markdown(nutrition)
         # --- Export/Download Buttons ---
         st.markdown("#### Export Recipe")
@@ -359,7 +409,7 @@ elif st.session_state.current_generated_recipe_text:
         display_text = st.session_state.current_generated_recipe_text
         if view_lang_code != "original":
             with st.spinner("Translating..."):
-                display_text = translate_text(st.session_state.current_generated_recipe_text, view_lang_code)
+                display_text = prefetcher.translation(st.session_state.current_generated_recipe_text, view_lang_code)
         st.markdown(display_text)
         # --- Export/Download Buttons ---
         st.markdown("#### 📤 Export Recipe")
@@ -487,9 +537,11 @@ else:
                     with col1:
                         if st.button("View Recipe", key=f"view_recipe_{idx}"):
                             st.session_state.selected_history_index = st.session_state.recipe_history.index(recipe)
+                            prefetcher.prefetch(model, recipe['text'], recipe['inputs']['ingredients'], st.session_state.recent_view_languages)
                             st.rerun()
                     with col2:
                         if st.button("🗑️", key=f"delete_recipe_{idx}"):
+                            prefetcher.cancel(recipe['text'])
                             del st.session_state.recipe_history[st.session_state.recipe_history.index(recipe)]
                             save_recipe_history(st.session_state.recipe_history)
                             st.session_state.selected_history_index = None
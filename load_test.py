@@ -0,0 +1,493 @@
+"""
+Concurrent-session load test for the Streamlit app.
+
+Starts one Streamlit server for app.py, as `streamlit run` would, and drives many
+simulated users against it at once over Streamlit's websocket protocol, sending the same
+messages a browser tab sends. All sessions share that one app process, so they contend
+for the GIL, the prefetch thread pool, the PDF layout pool, st.cache_resource and the
+token budget tracker the way real users do.
+Gemini and the translator are replaced inside the server by local stubs with configurable
+latency, so no API key or network access is needed. Each stage runs a fixed number of
+concurrent sessions through a mix of actions (generate a recipe, rerun, search history,
+build a weekly meal plan, export the history as PDF) and reports per-action latency
+percentiles, throughput, server memory per session and the session count at which
+latency saturates.
+
+Usage:
+    python load_test.py --users 1,2,4,8,16 --iterations 3 --gemini-latency 0.5
+"""
+import os
+import sys
+import math
+import time
+import random
+import shutil
+import socket
+import asyncio
+import argparse
+import tempfile
+import threading
+import subprocess
+import urllib.request
+from collections import defaultdict
+import websockets
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+import src.recipe_generation as recipe_generation
+import src.translation_utils as translation_utils
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_PATH = os.path.join(PROJECT_DIR, "app.py")
+SERVER_LOG = "server.log"
+SERVER_START_TIMEOUT = 60
+DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+SAMPLE_INGREDIENTS = [
+    "chicken, broccoli, rice",
+    "tofu, spinach, garlic",
+    "salmon, potatoes, dill",
+    "eggs, tomatoes, feta",
+    "lentils, carrots, cumin",
+]
+
+# --- Local stubs for external services ---
+
+class StubLatency:
+    def __init__(self, seconds, jitter):
+        self.seconds = seconds
+        self.jitter = jitter
+
+    def sleep(self):
+        time.sleep(max(0.0, self.seconds + random.uniform(-self.jitter, self.jitter)))
+
+class StubResponse:
+    def __init__(self, text):
+        self.text = text
+        self.prompt_feedback = None
+
+class StubModel:
+    """Stands in for genai.GenerativeModel and returns a recipe-shaped response."""
+
+    def __init__(self, latency, system_instruction=None):
+        self.latency = latency
+        self.system_instruction = system_instruction or ""
+        self._counter = 0
+        self._lock = threading.Lock()
+
+    def generate_content(self, prompt, generation_config=None):
+        self.latency.sleep()
+        with self._lock:
+            self._counter += 1
+            n = self._counter
+        if "nutritional content" in self.system_instruction + prompt:
+            return StubResponse("| Nutrient | Per Recipe | Per Serving |\n|---|---|---|\n| Calories | 2000 | 500 |")
+        steps = "\n".join(f"   {i}. Stub preparation step number {i}." for i in range(1, 13))
+        return StubResponse(
+            f"1. CREATIVE RECIPE NAME: Stub Dish {n}\n"
+            "2. DESCRIPTION: A load test recipe.\n"
+            "3. PREP TIME: 10 minutes\n4. COOK TIME: 20 minutes\n5. TOTAL TIME: 30 minutes\n"
+            "6. SERVINGS: 4 servings\n7. INGREDIENTS:\n   - 1 cup stub\n   - 2 tbsp stub oil\n"
+            f"9. PREPARATION STEPS:\n{steps}\n"
+            "10. SERVING SUGGESTIONS: Serve warm.\n11. CHEF'S TIPS: Keeps for 3 days."
+        )
+
+class StubGenai:
+    """Stands in for the google.generativeai module used by src.recipe_generation."""
+
+    def __init__(self, latency):
+        self.latency = latency
+
+    def configure(self, api_key=None, **kwargs):
+        pass
+
+    def GenerativeModel(self, model_name=None, system_instruction=None, **kwargs):
+        return StubModel(self.latency, system_instruction)
+
+def make_stub_translator(latency):
+    class StubTranslator:
+        def translate(self, text, dest):
+            latency.sleep()
+            return StubResponse(f"[{dest}] {text}")
+    return StubTranslator
+
+def install_stubs(gemini_latency, translate_latency, jitter):
+    os.environ.setdefault("GEMINI_API_KEY", "load-test")
+    recipe_generation.genai = StubGenai(StubLatency(gemini_latency, jitter))
+    translation_utils.Translator = make_stub_translator(StubLatency(translate_latency, jitter))
+
+# --- App server ---
+
+def serve(port, gemini_latency, translate_latency, jitter):
+    """
+    Runs app.py in a Streamlit server in this process, with the stubs installed first
+    so the app's modules pick them up. Called in the server subprocess.
+    """
+    from streamlit.web import bootstrap
+    install_stubs(gemini_latency, translate_latency, jitter)
+    flag_options = {
+        "server.port": port,
+        "server.address": "127.0.0.1",
+        "server.headless": True,
+        "server.fileWatcherType": "none",
+        "server.runOnSave": False,
+        "browser.gatherUsageStats": False,
+    }
+    bootstrap.load_config_options(flag_options=flag_options)
+    bootstrap.run(APP_PATH, False, [], flag_options)
+    return 0
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _log_tail(workdir, lines=20):
+    try:
+        with open(os.path.join(workdir, SERVER_LOG), "r", encoding="utf-8", errors="replace") as f:
+            return "".join(f.readlines()[-lines:])
+    except OSError:
+        return ""
+
+def start_server(options):
+    """
+    Starts the app server in a subprocess working in options["workdir"] and waits until
+    its health check answers. Returns (process, port).
+    """
+    port = _free_port()
+    command = [
+        sys.executable, os.path.abspath(__file__),
+        "--serve-port", str(port),
+        "--gemini-latency", str(options["gemini_latency"]),
+        "--translate-latency", str(options["translate_latency"]),
+        "--jitter", str(options["jitter"]),
+    ]
+    with open(os.path.join(options["workdir"], SERVER_LOG), "w") as log:
+        server = subprocess.Popen(command, cwd=options["workdir"], stdout=log, stderr=subprocess.STDOUT)
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"App server exited with code {server.returncode}:\n{_log_tail(options['workdir'])}")
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1) as response:
+                if response.status == 200:
+                    return server, port
+        except OSError:
+            time.sleep(0.2)
+    stop_server(server)
+    raise RuntimeError(f"App server did not start within {SERVER_START_TIMEOUT}s:\n{_log_tail(options['workdir'])}")
+
+def stop_server(server):
+    server.terminate()
+    try:
+        server.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        server.kill()
+        server.wait()
+
+# --- Simulated user ---
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+class SessionClient:
+    """
+    One browser tab's worth of Streamlit protocol: sends rerun requests with widget
+    values and reads the resulting deltas until the script run finishes.
+    """
+
+    def __init__(self, url, timeout):
+        self.url = url
+        self.timeout = timeout
+        self.websocket = None
+        self.widgets = {}
+        self.values = {}
+
+    async def connect(self):
+        self.websocket = await asyncio.wait_for(
+            websockets.connect(self.url, subprotocols=["streamlit"], max_size=None),
+            self.timeout,
+        )
+
+    async def close(self):
+        if self.websocket is not None:
+            await self.websocket.close()
+
+    def _find_widget(self, key):
+        for widget_id in self.widgets:
+            if widget_id.endswith(f"-{key}"):
+                return widget_id
+        return None
+
+    def widget_id(self, key):
+        """Id of the widget created with key= in the last run."""
+        widget_id = self._find_widget(key)
+        if widget_id is None:
+            raise LookupError(f"Widget {key!r} not found")
+        return widget_id
+
+    def submit_button_id(self, form, label):
+        """Id of a form's submit button in the last run."""
+        for widget_id in self.widgets:
+            if widget_id.endswith(f":{form}-{label}"):
+                return widget_id
+        raise LookupError(f"Submit button {label!r} of form {form!r} not found")
+
+    def set_text(self, key, value):
+        self.values[key] = value
+
+    async def run(self, trigger_ids=()):
+        """Reruns the script with the current widget values, pressing trigger_ids once."""
+        message = BackMsg()
+        message.rerun_script.query_string = ""
+        widget_states = message.rerun_script.widget_states.widgets
+        # Like a browser, send the value of every text input on the page, not just the changed ones.
+        for key, value in self.values.items():
+            widget_id = self._find_widget(key)
+            if widget_id is not None:
+                state = widget_states.add()
+                state.id = widget_id
+                state.string_value = value
+        for trigger_id in trigger_ids:
+            state = widget_states.add()
+            state.id = trigger_id
+            state.trigger_value = True
+        await self.websocket.send(message.SerializeToString())
+        await asyncio.wait_for(self._read_run(), self.timeout)
+
+    async def _read_run(self):
+        exceptions = []
+        while True:
+            message = ForwardMsg()
+            message.ParseFromString(await self.websocket.recv())
+            kind = message.WhichOneof("type")
+            if kind == "new_session":
+                self.widgets = {}
+                exceptions = []
+            elif kind == "delta" and message.delta.WhichOneof("type") == "new_element":
+                element = message.delta.new_element
+                element_type = element.WhichOneof("type")
+                if element_type == "exception":
+                    exceptions.append(element.exception.message)
+                elif element_type is not None:
+                    widget_id = getattr(getattr(element, element_type), "id", "")
+                    if widget_id:
+                        self.widgets[widget_id] = element_type
+            elif kind == "script_finished":
+                if message.script_finished == ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                    continue
+                if message.script_finished == ForwardMsg.FINISHED_WITH_COMPILE_ERROR:
+                    raise RuntimeError("app.py failed to compile")
+                if exceptions:
+                    raise RuntimeError(exceptions[0])
+                return
+
+class SimulatedUser:
+    def __init__(self, user_id, url, timeout, seed=None):
+        self.user_id = user_id
+        self.client = SessionClient(url, timeout)
+        self.random = random.Random(None if seed is None else seed + user_id)
+        self.timings = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.first_error = {}
+
+    async def _timed(self, action, interact=None):
+        start = time.perf_counter()
+        try:
+            await self.client.run(interact() if interact else ())
+        except Exception as e:
+            self.errors[action] += 1
+            self.first_error.setdefault(action, f"{type(e).__name__}: {e}")
+            return
+        self.timings[action].append(time.perf_counter() - start)
+
+    async def load(self):
+        try:
+            await self.client.connect()
+        except Exception as e:
+            self.errors["load"] += 1
+            self.first_error.setdefault("load", f"{type(e).__name__}: {e}")
+            raise
+        await self._timed("load")
+
+    async def rerun(self):
+        await self._timed("rerun")
+
+    async def generate_recipe(self):
+        def interact():
+            self.client.set_text("ingredients_input_box", self.random.choice(SAMPLE_INGREDIENTS))
+            return [self.client.submit_button_id("recipe_form_sidebar", "✨ Generate Recipe")]
+        await self._timed("generate_recipe", interact)
+
+    async def search_history(self):
+        def interact():
+            self.client.set_text("history_search", self.random.choice(["chicken", "stub", "tofu", "dish"]))
+            return [self.client.submit_button_id("history_filter_form", "Apply Filter/Search")]
+        await self._timed("search_history", interact)
+
+    async def weekly_plan(self):
+        def interact():
+            for day in DAYS:
+                self.client.set_text(f"mp_ing_{day}", self.random.choice(SAMPLE_INGREDIENTS))
+            return [self.client.widget_id("generate_meal_plan_btn")]
+        await self._timed("weekly_plan", interact)
+
+    async def export_pdf(self):
+        # "PDF" is the default export format.
+        await self._timed("export_pdf", lambda: [self.client.widget_id("prepare_history_export")])
+
+    async def session(self, iterations):
+        for _ in range(iterations):
+            await self.generate_recipe()
+            await self.rerun()
+            await self.search_history()
+            await self.weekly_plan()
+            await self.export_pdf()
+
+# --- Stages and reporting ---
+
+def rss_bytes(pid):
+    """
+    Current resident set size of a process, or None if it cannot be read.
+    Uses the optional `psutil` package when installed, otherwise /proc (Linux only).
+    """
+    try:
+        import psutil
+    except ImportError:
+        psutil = None
+    if psutil is not None:
+        try:
+            return psutil.Process(pid).memory_info().rss
+        except psutil.Error:
+            return None
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+async def run_stage(server, port, users, iterations, options):
+    """
+    Connects `users` sessions to the one app server, then runs them concurrently.
+    Every websocket read is bounded by options["timeout"], so a stuck or dead server
+    shows up as errors rather than a hang.
+    """
+    url = f"ws://127.0.0.1:{port}/_stcore/stream"
+    sessions = [SimulatedUser(i, url, options["timeout"], options["seed"]) for i in range(users)]
+    rss_before = rss_bytes(server.pid)
+    try:
+        loaded = await asyncio.gather(*(user.load() for user in sessions), return_exceptions=True)
+        active = [user for user, outcome in zip(sessions, loaded) if not isinstance(outcome, BaseException)]
+        start = time.perf_counter()
+        await asyncio.gather(*(user.session(iterations) for user in active))
+        elapsed = time.perf_counter() - start
+        rss_after = rss_bytes(server.pid)
+        memory = max(0, rss_after - rss_before) if rss_before is not None and rss_after is not None else None
+    finally:
+        await asyncio.gather(*(user.client.close() for user in sessions), return_exceptions=True)
+    if server.poll() is not None:
+        raise RuntimeError(f"App server exited with code {server.returncode} during the {users}-session stage:\n{_log_tail(options['workdir'])}")
+
+    timings = defaultdict(list)
+    errors = defaultdict(int)
+    first_error = {}
+    for user in sessions:
+        for action, values in user.timings.items():
+            timings[action].extend(values)
+        for action, count in user.errors.items():
+            errors[action] += count
+        for action, message in user.first_error.items():
+            first_error.setdefault(action, message)
+    completed = sum(len(values) for action, values in timings.items() if action != "load")
+    return {
+        "users": users,
+        "timings": timings,
+        "errors": errors,
+        "first_error": first_error,
+        "throughput": completed / elapsed if elapsed else 0.0,
+        "memory_per_session": memory / users if memory is not None else None,
+    }
+
+def print_stage(result):
+    print(f"\n=== {result['users']} concurrent session(s) on one app server ===")
+    print(f"{'action':<16}{'count':>7}{'p50 ms':>10}{'p90 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for action in sorted(set(result["timings"]) | set(result["errors"])):
+        values = result["timings"].get(action, [])
+        row = [percentile(values, pct) * 1000 for pct in (50, 90, 95, 99)]
+        print(f"{action:<16}{len(values):>7}" + "".join(f"{v:>10.1f}" for v in row) + f"{result['errors'].get(action, 0):>8}")
+    memory = result["memory_per_session"]
+    memory_text = f"{memory / 1024 / 1024:.1f} MiB" if memory is not None else "n/a (install psutil to measure it on this platform)"
+    print(f"throughput: {result['throughput']:.2f} actions/s, server memory per session: {memory_text}")
+    for action, message in sorted(result["first_error"].items()):
+        print(f"first {action} error: {message}")
+
+def interactive_p95(result):
+    values = [v for action, vs in result["timings"].items() if action != "load" for v in vs]
+    return percentile(values, 95)
+
+def find_saturation(results, factor):
+    """First session count whose interactive p95 exceeds the single-stage baseline by factor."""
+    baseline = interactive_p95(results[0])
+    for result in results[1:]:
+        if baseline and interactive_p95(result) > baseline * factor:
+            return result["users"]
+    return None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent-session load test for the AI Chef Streamlit app.")
+    parser.add_argument("--users", default="1,2,4,8,16", help="Comma-separated concurrent session counts, one stage each.")
+    parser.add_argument("--iterations", type=int, default=2, help="Action rounds per simulated user.")
+    parser.add_argument("--gemini-latency", type=float, default=0.5, help="Seconds per stubbed Gemini call.")
+    parser.add_argument("--translate-latency", type=float, default=0.2, help="Seconds per stubbed translation.")
+    parser.add_argument("--jitter", type=float, default=0.1, help="Random +/- seconds added to stub latencies.")
+    parser.add_argument("--saturation-factor", type=float, default=2.0, help="p95 growth over the first stage that counts as saturated.")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Seconds allowed per script run.")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for repeatable runs.")
+    parser.add_argument("--serve-port", type=int, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.serve_port is not None:
+        return serve(args.serve_port, args.gemini_latency, args.translate_latency, args.jitter)
+
+    user_counts = [int(n) for n in args.users.split(",") if n.strip()]
+
+    # History files are written relative to the server's working directory; keep them out of the project.
+    # The cached DejaVuSans.pkl metrics also refer to the font by a relative path, so copy it along.
+    with tempfile.TemporaryDirectory() as workdir:
+        shutil.copy(os.path.join(PROJECT_DIR, "DejaVuSans.ttf"), workdir)
+        options = {
+            "gemini_latency": args.gemini_latency,
+            "translate_latency": args.translate_latency,
+            "jitter": args.jitter,
+            "timeout": args.timeout,
+            "seed": args.seed,
+            "workdir": workdir,
+        }
+        try:
+            server, port = start_server(options)
+        except RuntimeError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return 1
+        results = []
+        try:
+            for users in user_counts:
+                result = asyncio.run(run_stage(server, port, users, args.iterations, options))
+                print_stage(result)
+                results.append(result)
+        except RuntimeError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return 1
+        finally:
+            stop_server(server)
+
+    saturation = find_saturation(results, args.saturation_factor)
+    if saturation is None:
+        print(f"\nNo saturation up to {user_counts[-1]} concurrent sessions (p95 stayed within {args.saturation_factor}x of the first stage).")
+    else:
+        print(f"\nSaturation at {saturation} concurrent sessions (p95 exceeded {args.saturation_factor}x the first stage).")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
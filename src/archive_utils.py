@@ -0,0 +1,290 @@
+"""
+Compressed, line-delimited archives of recipe and meal plan history.
+
+An archive is gzip (.gz) or zstd (.zst) compressed JSON Lines: a header line naming the
+history kind, then one record per line. Records are streamed one at a time in both
+directions, so archives of any size are exported and imported in constant memory
+(apart from a 20-byte digest per record kept for deduplication on import).
+
+Usage:
+    python -m src.archive_utils export recipes recipes.jsonl.gz
+    python -m src.archive_utils import meal_plans meal_plans.jsonl.zst
+"""
+import os
+import io
+import sys
+import json
+import gzip
+import hashlib
+import argparse
+import re
+
+ARCHIVE_FORMAT = "ai-chef-archive"
+ARCHIVE_VERSION = 1
+HISTORY_FILES = {
+    "recipes": "recipe_history.json",
+    "meal_plans": "meal_plan_history.json",
+}
+# Keys every record of a kind must have, as written by app.py and meal_plan_utils.
+REQUIRED_KEYS = {
+    "recipes": ("name", "text", "inputs"),
+    "meal_plans": ("date", "meal_plan", "inputs"),
+}
+LAYOUT_NEWLINE = re.compile(r"\n\s*")
+WHITESPACE = re.compile(r"\s*")
+READ_CHUNK_SIZE = 256 * 1024
+PROGRESS_EVERY = 1000
+WRITE_BATCH_SIZE = 500
+# Archives are mostly repetitive text; low levels already compress well and are much faster.
+GZIP_LEVEL = 1
+
+# --- Streaming access to the JSON history files ---
+
+def _single_line(json_text):
+    # JSON strings cannot contain raw newlines, so every newline is layout whitespace.
+    return LAYOUT_NEWLINE.sub("", json_text)
+
+def iter_history_lines(history_file, chunk_size=READ_CHUNK_SIZE):
+    """
+    Yields each record of a JSON array file as single-line JSON text, one at a time,
+    without loading the whole file. Records are parsed only to find where they end,
+    so their text is passed through without being re-encoded.
+    Records must be separated by exactly one comma, and nothing but whitespace may
+    follow the closing bracket.
+    A missing file yields nothing, like load_recipe_history/load_meal_plan_history.
+    """
+    if not os.path.exists(history_file):
+        return
+    decoder = json.JSONDecoder()
+    with open(history_file, "r", encoding="utf-8") as f:
+        buf = ""
+        pos = 0
+        # What the next non-whitespace character must be:
+        # "open" the "[", "first" a record or "]", "separator" a "," or "]",
+        # "record" a record, "closed" nothing at all.
+        expect = "open"
+        eof = False
+        while True:
+            pos = WHITESPACE.match(buf, pos).end()
+            if pos < len(buf):
+                char = buf[pos]
+                if expect == "open":
+                    if char != "[":
+                        raise ValueError(f"{history_file} does not contain a JSON array")
+                    expect = "first"
+                    pos += 1
+                    continue
+                if expect == "closed":
+                    raise ValueError(f"{history_file} has extra data after the JSON array")
+                if char == "]" and expect in ("first", "separator"):
+                    expect = "closed"
+                    pos += 1
+                    continue
+                if expect == "separator":
+                    if char != ",":
+                        raise ValueError(f"{history_file} is not a valid JSON array: expected ',' or ']' after a record")
+                    expect = "record"
+                    pos += 1
+                    continue
+                if char in ",]":
+                    raise ValueError(f"{history_file} is not a valid JSON array: expected a record, found '{char}'")
+                try:
+                    _, end = decoder.raw_decode(buf, pos)
+                except json.JSONDecodeError as e:
+                    if eof:
+                        raise ValueError(f"{history_file} contains an invalid record: {e.msg}") from e
+                else:
+                    # A value that runs to the end of the buffer may continue in the next chunk.
+                    if end < len(buf) or eof:
+                        yield _single_line(buf[pos:end])
+                        pos = end
+                        expect = "separator"
+                        continue
+            elif eof:
+                if expect in ("open", "closed"):
+                    return
+                raise ValueError(f"{history_file} ends before the JSON array is closed")
+            # Need more data: drop what has been consumed and read the next chunk.
+            buf = buf[pos:]
+            pos = 0
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buf += chunk
+
+def write_history_file(lines, history_file):
+    """
+    Writes single-line JSON records (one str per record) as a JSON array, one record per line,
+    replacing history_file atomically. Returns the number of records written.
+    """
+    tmp_path = history_file + ".tmp"
+    count = 0
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write("[")
+            batch = []
+            for line in lines:
+                batch.append(line)
+                if len(batch) == WRITE_BATCH_SIZE:
+                    f.write(("," if count else "") + "\n" + ",\n".join(batch))
+                    count += len(batch)
+                    batch = []
+            if batch:
+                f.write(("," if count else "") + "\n" + ",\n".join(batch))
+                count += len(batch)
+            f.write("\n]" if count else "]")
+        os.replace(tmp_path, history_file)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    return count
+
+# --- Compressed JSONL archives ---
+
+def _open_archive(path, mode):
+    """Opens a .gz or .zst archive in binary mode. zstd support needs the optional `zstandard` package."""
+    if path.endswith(".zst"):
+        try:
+            import zstandard
+        except ImportError:
+            raise RuntimeError("zstd archives need the `zstandard` package: pip install zstandard")
+        raw = open(path, mode + "b")
+        if mode == "w":
+            return zstandard.ZstdCompressor().stream_writer(raw, closefd=True)
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(raw, closefd=True))
+    return gzip.open(path, mode + "b", compresslevel=GZIP_LEVEL)
+
+def _check_record(record, kind, path, line_number):
+    if not isinstance(record, dict):
+        raise ValueError(f"{path} line {line_number}: expected a JSON object, got {type(record).__name__}")
+    missing = [key for key in REQUIRED_KEYS[kind] if key not in record]
+    if missing:
+        raise ValueError(f"{path} line {line_number}: {kind} record is missing {', '.join(missing)}")
+
+def iter_archive_lines(path, kind):
+    """
+    Yields each record of an archive as its JSON line (without the newline),
+    checking that the archive header matches kind and that every line is a JSON
+    object with the keys REQUIRED_KEYS lists for kind.
+    """
+    with _open_archive(path, "r") as f:
+        try:
+            header = json.loads(f.readline() or b"null")
+        except ValueError:
+            header = None
+        if not isinstance(header, dict) or header.get("format") != ARCHIVE_FORMAT:
+            raise ValueError(f"{path} is not a recipe history archive")
+        if header.get("kind") != kind:
+            raise ValueError(f"{path} contains {header.get('kind')}, not {kind}")
+        for line_number, raw in enumerate(f, start=2):
+            line = raw.decode("utf-8").strip()
+            if line:
+                _check_record(json.loads(line), kind, path, line_number)
+                yield line
+
+def iter_archive(path, kind):
+    """Yields the records of an archive as dicts."""
+    for line in iter_archive_lines(path, kind):
+        yield json.loads(line)
+
+def write_archive(lines, path, kind, progress=None):
+    """
+    Streams single-line JSON records into a compressed JSONL archive.
+    progress: optional callable receiving the running record count.
+    Returns the number of records written.
+    """
+    count = 0
+    with _open_archive(path, "w") as f:
+        f.write((json.dumps({"format": ARCHIVE_FORMAT, "version": ARCHIVE_VERSION, "kind": kind}) + "\n").encode("utf-8"))
+        batch = []
+        for line in lines:
+            batch.append(line)
+            if len(batch) == WRITE_BATCH_SIZE:
+                f.write(("\n".join(batch) + "\n").encode("utf-8"))
+                count += len(batch)
+                batch = []
+                if progress and count % PROGRESS_EVERY == 0:
+                    progress(count)
+        if batch:
+            f.write(("\n".join(batch) + "\n").encode("utf-8"))
+            count += len(batch)
+    if progress:
+        progress(count)
+    return count
+
+def line_digest(line):
+    """
+    Digest of a single-line JSON record, used to skip records already in the history.
+    The app always writes records the same way, so equal records have equal text.
+    """
+    return hashlib.sha1(line.encode("utf-8")).digest()
+
+# --- Commands ---
+
+def export_history_archive(kind, path, history_file=None, progress=None):
+    """Exports a history file to an archive. Returns the number of records exported."""
+    history_file = history_file or HISTORY_FILES[kind]
+    return write_archive(iter_history_lines(history_file), path, kind, progress=progress)
+
+def import_history_archive(kind, path, history_file=None, progress=None):
+    """
+    Appends the records of an archive to a history file, skipping duplicates.
+    Returns (imported, skipped).
+    """
+    history_file = history_file or HISTORY_FILES[kind]
+    seen = set()
+    counts = {"imported": 0, "skipped": 0}
+
+    def merged():
+        for line in iter_history_lines(history_file):
+            seen.add(line_digest(line))
+            yield line
+        for line in iter_archive_lines(path, kind):
+            digest = line_digest(line)
+            if digest in seen:
+                counts["skipped"] += 1
+            else:
+                seen.add(digest)
+                counts["imported"] += 1
+                yield line
+            processed = counts["imported"] + counts["skipped"]
+            if progress and processed % PROGRESS_EVERY == 0:
+                progress(processed)
+
+    write_history_file(merged(), history_file)
+    if progress:
+        progress(counts["imported"] + counts["skipped"])
+    return counts["imported"], counts["skipped"]
+
+def _print_progress(count):
+    print(f"\r{count} records processed", end="", file=sys.stderr, flush=True)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export or import recipe and meal plan history archives.")
+    parser.add_argument("command", choices=["export", "import"])
+    parser.add_argument("kind", choices=sorted(HISTORY_FILES))
+    parser.add_argument("archive", help="Archive path ending in .gz or .zst")
+    parser.add_argument("--history-file", default=None, help="History JSON file (defaults to the app's file for this kind)")
+    parser.add_argument("--quiet", action="store_true", help="Do not report progress")
+    args = parser.parse_args(argv)
+
+    progress = None if args.quiet else _print_progress
+    try:
+        if args.command == "export":
+            count = export_history_archive(args.kind, args.archive, args.history_file, progress=progress)
+            summary = f"Exported {count} records to {args.archive}"
+        else:
+            imported, skipped = import_history_archive(args.kind, args.archive, args.history_file, progress=progress)
+            summary = f"Imported {imported} records, skipped {skipped} duplicates"
+    except (OSError, ValueError, RuntimeError) as e:
+        if progress:
+            print(file=sys.stderr)
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    if progress:
+        print(file=sys.stderr)
+    print(summary)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
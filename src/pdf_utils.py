@@ -1,42 +1,242 @@
 import os
 import io
+import tempfile
+import zipfile
+import itertools
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from fpdf import FPDF
+from pypdf import PdfReader, PdfWriter
 import streamlit as st
 
-def recipe_to_pdf(recipe_name, recipe_text):
-    pdf = FPDF()
+FONT_PATH = os.path.join(os.path.dirname(__file__), "..", "DejaVuSans.ttf")
+FONT_MISSING_MESSAGE = "DejaVuSans.ttf font file not found in the project root directory. Please download it from https://dejavu-fonts.github.io/ and place it in the project root for full Unicode PDF support."
+
+# Recipes laid out per worker document. Each document embeds the font once, so
+# batching keeps merged exports small while still spreading work across processes.
+RECIPES_PER_CHUNK = 25
+# Below this many recipes the process pool costs more than it saves.
+PARALLEL_THRESHOLD = 8
+# Layout processes shared by all sessions of one app process.
+PDF_POOL_WORKERS = min(4, os.cpu_count() or 1)
+STREAM_CHUNK_SIZE = 64 * 1024
+SPOOL_MAX_SIZE = 8 * 1024 * 1024
+
+def _font_available():
+    if not os.path.exists(FONT_PATH):
+        st.error(FONT_MISSING_MESSAGE)
+        return False
+    return True
+
+def _pdf_bytes(pdf):
+    """
+    Returns the finished document as bytes without dropping any data.
+    fpdf 1.x returns a latin-1 str, fpdf2 returns a bytearray.
+    """
+    data = pdf.output(dest='S')
+    if isinstance(data, str):
+        return data.encode('latin1')
+    return bytes(data)
+
+def _add_recipe_pages(pdf, title, text):
     pdf.add_page()
-    pdf.set_auto_page_break(auto=True, margin=15)
-    font_path = os.path.join(os.path.dirname(__file__), "..", "DejaVuSans.ttf")
-    if not os.path.exists(font_path):
-        st.error("DejaVuSans.ttf font file not found in the project root directory. Please download it from https://dejavu-fonts.github.io/ and place it in the project root for full Unicode PDF support.")
-        return io.BytesIO(b"")
-    pdf.add_font("DejaVu", "", font_path, uni=True)
     pdf.set_font("DejaVu", "", 16)
-    pdf.cell(0, 10, recipe_name, ln=True)
+    pdf.cell(0, 10, title, ln=True)
     pdf.set_font("DejaVu", "", 12)
-    for line in recipe_text.split('\n'):
+    for line in text.split('\n'):
         pdf.multi_cell(0, 8, line)
-    pdf_bytes = pdf.output(dest='S').encode('latin1', 'ignore')
-    return io.BytesIO(pdf_bytes)
 
-def meal_plan_to_pdf(meal_plan):
+def _layout_recipes(items):
     """
-    meal_plan: dict of {day: (recipe_name, recipe_text)}
-    Returns: BytesIO PDF
+    Lays out a batch of (title, text) pairs into one PDF document.
+    Runs inside worker processes, so it must not touch Streamlit.
     """
     pdf = FPDF()
-    font_path = os.path.join(os.path.dirname(__file__), "..", "DejaVuSans.ttf")
-    if not os.path.exists(font_path):
-        st.error("DejaVuSans.ttf font file not found in the project root directory. Please download it from https://dejavu-fonts.github.io/ and place it in the project root for full Unicode PDF support.")
+    pdf.set_auto_page_break(auto=True, margin=15)
+    pdf.add_font("DejaVu", "", FONT_PATH, uni=True)
+    for title, text in items:
+        _add_recipe_pages(pdf, title, text)
+    return _pdf_bytes(pdf)
+
+def _batched(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+@st.cache_resource
+def get_pdf_pool():
+    """
+    One layout pool per app process, shared by every session and capped at PDF_POOL_WORKERS.
+    Workers are spawned rather than forked, so they never inherit locks held by the
+    server's threads.
+    """
+    return ProcessPoolExecutor(max_workers=PDF_POOL_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+
+def render_recipe_documents(items, recipes_per_chunk=RECIPES_PER_CHUNK, parallel=True):
+    """
+    items: iterable of (title, text) pairs
+    Yields: PDF bytes per batch of recipes, in input order.
+    Batches are laid out in the shared process pool with at most two batches per worker
+    in flight, so only a bounded number of batches is held at once.
+    """
+    batches = _batched(items, recipes_per_chunk)
+    if not parallel:
+        for batch in batches:
+            yield _layout_recipes(batch)
+        return
+    executor = get_pdf_pool()
+    pending = deque()
+    try:
+        for batch in batches:
+            pending.append(executor.submit(_layout_recipes, batch))
+            if len(pending) >= PDF_POOL_WORKERS * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    except BrokenProcessPool:
+        # Drop the dead pool so the next export starts a fresh one.
+        get_pdf_pool.clear()
+        raise
+
+def _peek(items):
+    """
+    Returns (head, items, small): the first PARALLEL_THRESHOLD items, the full iterable
+    with nothing consumed, and whether the whole input fits in head.
+    """
+    items = iter(items)
+    head = list(itertools.islice(items, PARALLEL_THRESHOLD))
+    return head, itertools.chain(head, items), len(head) < PARALLEL_THRESHOLD
+
+def _write_bytes(data, output):
+    if isinstance(output, (str, os.PathLike)):
+        with open(output, "wb") as f:
+            f.write(data)
+    else:
+        output.write(data)
+
+def write_recipes_pdf(items, output):
+    """
+    Lays out (title, text) pairs and merges them into a single PDF.
+    Small jobs are laid out in one fpdf document in-process. Larger ones are laid out in
+    parallel and merged with pypdf, which keeps every batch in memory until the final write.
+    output: file path or binary file object
+    Returns: True on success, False if the font is missing.
+    """
+    if not _font_available():
+        return False
+    head, items, small = _peek(items)
+    if small:
+        _write_bytes(_layout_recipes(head), output)
+        return True
+    writer = PdfWriter()
+    for document in render_recipe_documents(items):
+        writer.append(PdfReader(io.BytesIO(document)))
+    if isinstance(output, (str, os.PathLike)):
+        with open(output, "wb") as f:
+            writer.write(f)
+    else:
+        writer.write(output)
+    return True
+
+def write_recipes_zip(items, output):
+    """
+    Writes one PDF per (title, text) pair into a ZIP archive.
+    Items are consumed lazily and each recipe is compressed into the archive as soon as
+    it is laid out, so memory stays bounded however long the history is.
+    output: file path or binary file object
+    Returns: True on success, False if the font is missing.
+    """
+    if not _font_available():
+        return False
+    _, items, small = _peek(items)
+    titles = deque()
+
+    def tracked():
+        for title, text in items:
+            titles.append(title)
+            yield title, text
+
+    seen = {}
+    with zipfile.ZipFile(output, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for document in render_recipe_documents(tracked(), recipes_per_chunk=1, parallel=not small):
+            archive.writestr(_unique_file_name(titles.popleft(), seen), document)
+    return True
+
+def _unique_file_name(title, seen):
+    base = "".join(c for c in title if c.isalnum() or c in " -_").strip() or "Recipe"
+    count = seen.get(base, 0)
+    seen[base] = count + 1
+    return f"{base}.pdf" if count == 0 else f"{base} ({count + 1}).pdf"
+
+def stream_file(fileobj, chunk_size=STREAM_CHUNK_SIZE):
+    """Yields the contents of a binary file object in fixed-size chunks."""
+    fileobj.seek(0)
+    while True:
+        chunk = fileobj.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+def stream_recipes_pdf(items, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Generator variant of write_recipes_pdf.
+    The document is spooled to a temporary file and yielded in chunks.
+    """
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as spool:
+        if write_recipes_pdf(items, spool):
+            yield from stream_file(spool, chunk_size)
+
+def history_export_items(recipe_history):
+    """Maps recipe history entries to (title, text) pairs for export."""
+    for recipe in recipe_history:
+        yield recipe['name'] or "Untitled Recipe", recipe['text']
+
+def export_history(recipe_history, fmt="pdf"):
+    """
+    Exports the whole recipe history as one PDF or as a ZIP of per-recipe PDFs.
+    Returns: an open binary temporary file positioned at the start, or None if the
+    font is missing. The file is deleted when it is closed, on every platform, and
+    the caller is responsible for closing it.
+    """
+    writer = write_recipes_zip if fmt == "zip" else write_recipes_pdf
+    tmp = tempfile.TemporaryFile()
+    try:
+        ok = writer(history_export_items(recipe_history), tmp)
+    except BaseException:
+        tmp.close()
+        raise
+    if not ok:
+        tmp.close()
+        return None
+    tmp.seek(0)
+    return tmp
+
+def recipe_to_pdf(recipe_name, recipe_text):
+    if not _font_available():
+        return io.BytesIO(b"")
+    return io.BytesIO(_layout_recipes([(recipe_name, recipe_text)]))
+
+def meal_plan_to_pdf(meal_plan, output=None):
+    """
+    meal_plan: dict of {day: (recipe_name, recipe_text)}
+    output: optional file path or binary file object to stream the PDF into
+    Returns: BytesIO PDF, or the output target when one is given.
+    If the font is missing: an empty BytesIO, or None when an output target was given.
+    """
+    items = [(f"{day}: {recipe_name}", recipe_text) for day, (recipe_name, recipe_text) in meal_plan.items()]
+    if output is not None:
+        if not write_recipes_pdf(items, output):
+            return None
+        return output
+    buffer = io.BytesIO()
+    if not write_recipes_pdf(items, buffer):
         return io.BytesIO(b"")
-    pdf.add_font("DejaVu", "", font_path, uni=True)
-    for day, (recipe_name, recipe_text) in meal_plan.items():
-        pdf.add_page()
-        pdf.set_font("DejaVu", "", 16)
-        pdf.cell(0, 10, f"{day}: {recipe_name}", ln=True)
-        pdf.set_font("DejaVu", "", 12)
-        for line in recipe_text.split('\n'):
-            pdf.multi_cell(0, 8, line)
-    pdf_bytes = pdf.output(dest='S').encode('latin1', 'ignore')
-    return io.BytesIO(pdf_bytes)
+    buffer.seek(0)
+    return buffer
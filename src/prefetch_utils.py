@@ -0,0 +1,134 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+import streamlit as st
+from src.translation_utils import request_translation
+from src.nutrition_utils import request_nutritional_analysis
+
+# Background requests allowed at once across all sessions.
+PREFETCH_MAX_WORKERS = 3
+# How many of the user's recently viewed languages are translated ahead of time.
+MAX_RECENT_LANGUAGES = 2
+# Cached translations/analyses kept before the oldest ones are evicted.
+MAX_CACHE_ENTRIES = 256
+
+def recipe_key(recipe_text):
+    """Stable cache key for a recipe, derived from its text."""
+    return hashlib.sha1(recipe_text.encode("utf-8")).hexdigest()
+
+def nutrition_language(view_lang_code):
+    return view_lang_code if view_lang_code != "original" else "en"
+
+def remember_view_language(recent_languages, view_lang_code):
+    """Moves view_lang_code to the front of the recent list, keeping at most MAX_RECENT_LANGUAGES."""
+    if view_lang_code == "original":
+        return recent_languages
+    recent = [view_lang_code] + [code for code in recent_languages if code != view_lang_code]
+    return recent[:MAX_RECENT_LANGUAGES]
+
+class RecipePrefetcher:
+    """
+    Starts translation and nutrition requests in the background as soon as a recipe exists.
+    Futures are cached per (recipe, kind, language), so a view that needs a result either
+    gets it immediately or waits on the request already running instead of starting another.
+    """
+
+    def __init__(self, max_workers=PREFETCH_MAX_WORKERS, max_entries=MAX_CACHE_ENTRIES):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="recipe-prefetch")
+        self._lock = threading.Lock()
+        self._futures = OrderedDict()
+        self._max_entries = max_entries
+
+    def _evict(self):
+        # Caller holds the lock. Evicted futures are returned rather than cancelled here,
+        # because cancelling runs done callbacks that take the lock again.
+        evicted = []
+        while len(self._futures) > self._max_entries:
+            evicted.append(self._futures.popitem(last=False)[1])
+        return evicted
+
+    def _submit(self, cache_key, fn, *args):
+        with self._lock:
+            future = self._futures.get(cache_key)
+            if future is not None:
+                self._futures.move_to_end(cache_key)
+                return future
+            future = self._executor.submit(fn, *args)
+            self._futures[cache_key] = future
+            evicted = self._evict()
+        for stale in evicted:
+            stale.cancel()
+        future.add_done_callback(lambda f: self._discard_failed(cache_key, f))
+        return future
+
+    def _discard_failed(self, cache_key, future):
+        # Failed requests are not cached, so the next view retries them.
+        if future.cancelled() or future.exception() is not None:
+            with self._lock:
+                if self._futures.get(cache_key) is future:
+                    del self._futures[cache_key]
+
+    def prefetch(self, model, recipe_text, ingredients_text, languages):
+        """Queues nutrition analysis (English plus each language) and translations into each language."""
+        key = recipe_key(recipe_text)
+        self._submit((key, "nutrition", "en"), request_nutritional_analysis, model, ingredients_text, "en")
+        for lang in languages[:MAX_RECENT_LANGUAGES]:
+            self._submit((key, "translation", lang), request_translation, recipe_text, lang)
+            self._submit((key, "nutrition", lang), request_nutritional_analysis, model, ingredients_text, lang)
+
+    def _cached(self, cache_key, fn, *args):
+        """
+        Returns the cached or in-flight result for cache_key. Only requests that are
+        already running or done are waited on: a request still queued behind other
+        prefetch work is cancelled and, like a miss or a failed request, run in the
+        calling thread instead. Successes are cached.
+        """
+        with self._lock:
+            future = self._futures.get(cache_key)
+        # Cancelling runs the done callbacks, which take the lock, so it happens outside it.
+        # cancel() only succeeds while the request has not started.
+        if future is not None and not future.cancel():
+            try:
+                return future.result()
+            except Exception:
+                pass
+        result = fn(*args)
+        future = Future()
+        future.set_result(result)
+        with self._lock:
+            self._futures[cache_key] = future
+            evicted = self._evict()
+        for stale in evicted:
+            stale.cancel()
+        return result
+
+    def translation(self, recipe_text, view_lang_code):
+        """Returns the translated recipe, waiting on a prefetched request if one is in flight."""
+        if view_lang_code == "original":
+            return recipe_text
+        try:
+            return self._cached((recipe_key(recipe_text), "translation", view_lang_code), request_translation, recipe_text, view_lang_code)
+        except Exception as e:
+            st.warning(f"Translation failed: {e}")
+            return recipe_text
+
+    def nutrition(self, model, recipe_text, ingredients_text, language):
+        """Returns the nutritional analysis, waiting on a prefetched request if one is in flight."""
+        try:
+            return self._cached((recipe_key(recipe_text), "nutrition", language), request_nutritional_analysis, model, ingredients_text, language)
+        except Exception as e:
+            return f"Nutritional analysis failed: {e}"
+
+    def cancel(self, recipe_text):
+        """Cancels queued work and drops cached results for a deleted recipe."""
+        key = recipe_key(recipe_text)
+        with self._lock:
+            stale = [self._futures.pop(cache_key) for cache_key in list(self._futures) if cache_key[0] == key]
+        for future in stale:
+            future.cancel()
+
+@st.cache_resource
+def get_prefetcher():
+    """One prefetcher per app process, shared by every session."""
+    return RecipePrefetcher()
@@ -0,0 +1,257 @@
+import os
+import json
+import math
+import time
+import string
+import threading
+from collections import defaultdict, deque
+from src.history_utils import load_recipe_history
+
+TOKEN_USAGE_FILE = "token_usage.jsonl"
+# The usage log is rotated to TOKEN_USAGE_FILE + ".1" once it reaches this size,
+# so at most two files' worth of entries are kept and replayed at startup.
+TOKEN_USAGE_MAX_BYTES = 1024 * 1024
+CHARS_PER_TOKEN = 4
+# Output budgets are the largest recent response for the same kind of request plus headroom,
+# once enough responses have been seen. Until then the full ceiling is used.
+BUDGET_HEADROOM = 1.3
+BUDGET_MIN_SAMPLES = 5
+BUDGET_SAMPLES = 50
+BUDGET_FLOOR = 256
+
+RECIPE_OUTPUT_CEILING = 3500
+NUTRITION_OUTPUT_CEILING = 800
+
+# --- Static preambles (sent as system instructions, identical on every call) ---
+
+RECIPE_PREAMBLE = """You write detailed recipes for home cooks.
+
+Every recipe must include:
+1. CREATIVE RECIPE NAME (make this appealing and unique)
+2. A short, enticing DESCRIPTION of the dish (1-2 sentences).
+3. PREP TIME: (e.g., 15 minutes)
+4. COOK TIME: (e.g., 30 minutes)
+5. TOTAL TIME: (Prep + Cook)
+6. SERVINGS: (e.g., 4 servings)
+7. INGREDIENTS:
+   - List all ingredients with precise measurements (e.g., 1 cup, 2 tbsp, 100g).
+   - Organize by category if needed (e.g., "For the marinade:", "For the main dish:").
+8. EQUIPMENT: (Optional: list any special equipment needed, e.g., "9x13 inch baking dish")
+9. PREPARATION STEPS:
+   - Numbered, clear, concise instructions.
+   - Include cooking temperatures and estimated times for each major step.
+   - Start with preheating oven/preparing pans if necessary.
+10. SERVING SUGGESTIONS:
+    - How to plate or present the dish.
+    - Recommended side dishes or accompaniments.
+11. CHEF'S TIPS: (Optional: 1-2 helpful tips, variations, or storage instructions)
+
+Make the recipe easy to follow for home cooks.
+Be creative and ensure the recipe sounds delicious!
+The very first line of your response MUST be "1. CREATIVE RECIPE NAME: [Actual Name Here]". Do not add any other text or numbering before this line.
+For subsequent sections like "2. DESCRIPTION:", "3. PREP TIME:", etc., also ensure they start on a new line with the number and title.
+"""
+
+NUTRITION_PREAMBLE = """Analyze the list of ingredients you are given and estimate the total nutritional content for the entire recipe.
+Provide a table with Calories, Protein (g), Fat (g), Carbohydrates (g), Fiber (g), and Sugar (g) per recipe and per serving (assume 4 servings if not specified).
+If possible, also estimate sodium and cholesterol.
+List any assumptions you make.
+"""
+
+# --- Precompiled per-request templates ---
+
+RECIPE_REQUEST = string.Template("""Create a detailed $meal_type recipe using primarily these ingredients: $ingredients.
+
+Requirements:
+- Diet: $diet
+- Cuisine style: $cuisine
+- Cooking skill level: $skill_level
+$extra_requirements""")
+
+NUTRITION_REQUEST = string.Template("""Respond in $language.
+Ingredients:
+$ingredients""")
+
+def compile_recipe_request(ingredients, diet, cuisine, meal_type, skill_level="Any", total_time="", language="Any (auto-detect)"):
+    extra = []
+    if total_time.strip():
+        extra.append(f"- The total time for the recipe (prep + cook) should not exceed {total_time} minutes.")
+    if language and not language.startswith("Any"):
+        extra.append(f"- Write the whole recipe in {language}.")
+    return RECIPE_REQUEST.substitute(
+        meal_type=meal_type.lower(),
+        ingredients=ingredients,
+        diet=diet if diet != "None" else "No dietary restrictions",
+        cuisine=cuisine if cuisine and cuisine != "Any" else "Any style is acceptable",
+        skill_level=skill_level if skill_level != "Any" else "Any skill level (make it accessible)",
+        extra_requirements="\n".join(extra),
+    )
+
+def compile_nutrition_request(ingredients_text, language="en"):
+    return NUTRITION_REQUEST.substitute(language=language, ingredients=ingredients_text)
+
+# --- Token counting ---
+
+def estimate_tokens(text):
+    """Local token estimate (about 4 characters per token), used where an API round-trip would cost more than it saves."""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+_preamble_tokens = {}
+_preamble_lock = threading.Lock()
+
+def register_preamble(model, preamble):
+    """Counts a static preamble with the Gemini tokenizer, once per process."""
+    with _preamble_lock:
+        if preamble in _preamble_tokens:
+            return
+    try:
+        tokens = model.count_tokens(preamble).total_tokens
+    except Exception:
+        tokens = estimate_tokens(preamble)
+    with _preamble_lock:
+        _preamble_tokens[preamble] = tokens
+
+def preamble_tokens(preamble):
+    """The registered token count of a preamble, or a local estimate if it was never registered."""
+    with _preamble_lock:
+        tokens = _preamble_tokens.get(preamble)
+    return tokens if tokens is not None else estimate_tokens(preamble)
+
+def count_prompt_tokens(preamble, request_text):
+    """
+    Counts prompt tokens before a request: the registered preamble count plus a local
+    estimate for the short per-request part.
+    """
+    return preamble_tokens(preamble) + estimate_tokens(request_text)
+
+# --- Adaptive output budgets and accounting ---
+
+def _usage_value(response, field):
+    usage = getattr(response, "usage_metadata", None)
+    value = getattr(usage, field, None) if usage is not None else None
+    return value if isinstance(value, int) else None
+
+def _hit_token_limit(response):
+    try:
+        reason = response.candidates[0].finish_reason
+    except (AttributeError, IndexError, TypeError):
+        return False
+    return getattr(reason, "name", reason) in ("MAX_TOKENS", 2)
+
+def _response_text(response):
+    try:
+        return response.text or ""
+    except Exception:
+        return ""
+
+class TokenBudgets:
+    """
+    Tracks recent output sizes per (kind, *key) and derives max_output_tokens from them.
+    Keys are (meal_type, skill_level, language) for recipes and (language,) for nutrition.
+    """
+
+    def __init__(self, usage_file=TOKEN_USAGE_FILE):
+        self.usage_file = usage_file
+        self._samples = defaultdict(lambda: deque(maxlen=BUDGET_SAMPLES))
+        self._lock = threading.Lock()
+
+    def observe(self, kind, key, output_tokens):
+        with self._lock:
+            self._samples[(kind, *key)].append(output_tokens)
+
+    def budget(self, kind, key, ceiling):
+        with self._lock:
+            samples = list(self._samples.get((kind, *key), ()))
+        if len(samples) < BUDGET_MIN_SAMPLES:
+            return ceiling
+        return min(ceiling, max(BUDGET_FLOOR, math.ceil(max(samples) * BUDGET_HEADROOM)))
+
+    def seed_from_history(self, recipe_history):
+        """
+        Estimates recipe output sizes from previously generated recipes, for keys that
+        have no measured samples yet. Recipes generated since the usage log started are
+        already counted there, so seed from the log first.
+        """
+        with self._lock:
+            measured = {key for key, samples in self._samples.items() if samples}
+        for recipe in recipe_history:
+            inputs = recipe.get('inputs', {})
+            key = (inputs.get('meal_type', 'Dinner'), inputs.get('skill_level', 'Any'), inputs.get('language', 'Any (auto-detect)'))
+            if ("recipe", *key) not in measured:
+                self.observe("recipe", key, estimate_tokens(recipe.get('text', '')))
+
+    def seed_from_usage_log(self):
+        """Replays measured output sizes from the rotated and current token usage logs, oldest first."""
+        for path in (self.usage_file + ".1", self.usage_file):
+            if not os.path.exists(path):
+                continue
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    if entry.get("output_tokens") is not None and not entry.get("truncated"):
+                        self.observe(entry["kind"], tuple(entry["key"]), entry["output_tokens"])
+
+    def record(self, entry):
+        """Appends one call's token accounting to the usage log, rotating it when it is full."""
+        with self._lock:
+            try:
+                if os.path.exists(self.usage_file) and os.path.getsize(self.usage_file) >= TOKEN_USAGE_MAX_BYTES:
+                    os.replace(self.usage_file, self.usage_file + ".1")
+                with open(self.usage_file, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            except Exception:
+                pass
+
+    def generate(self, model, kind, key, preamble, request_text, generation_config, ceiling):
+        """
+        Sends request_text with an adaptive max_output_tokens and records the call.
+        If the response stops at a reduced budget, it is requested once more with the
+        full ceiling so adaptive budgets never truncate output.
+        """
+        prompt_tokens = count_prompt_tokens(preamble, request_text)
+        max_output_tokens = self.budget(kind, key, ceiling)
+        while True:
+            start = time.perf_counter()
+            response = model.generate_content(request_text, generation_config={**generation_config, "max_output_tokens": max_output_tokens})
+            truncated = _hit_token_limit(response)
+            output_tokens = _usage_value(response, "candidates_token_count")
+            if output_tokens is None:
+                output_tokens = estimate_tokens(_response_text(response))
+            self.record({
+                "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "kind": kind,
+                "key": list(key),
+                "prompt_tokens_counted": prompt_tokens,
+                "prompt_tokens": _usage_value(response, "prompt_token_count"),
+                "cached_tokens": _usage_value(response, "cached_content_token_count"),
+                "output_tokens": output_tokens,
+                "max_output_tokens": max_output_tokens,
+                "truncated": truncated,
+                "seconds": round(time.perf_counter() - start, 3),
+            })
+            if not truncated:
+                self.observe(kind, key, output_tokens)
+            if not truncated or max_output_tokens >= ceiling:
+                return response
+            max_output_tokens = ceiling
+
+_token_budgets = None
+_token_budgets_lock = threading.Lock()
+
+def get_token_budgets():
+    """
+    One budget tracker per app process, seeded from the usage log and, for keys the log
+    has not measured, from recipe history.
+    A plain module singleton rather than st.cache_resource, as prefetch threads use it too.
+    """
+    global _token_budgets
+    with _token_budgets_lock:
+        if _token_budgets is None:
+            budgets = TokenBudgets()
+            budgets.seed_from_usage_log()
+            budgets.seed_from_history(load_recipe_history())
+            _token_budgets = budgets
+        return _token_budgets
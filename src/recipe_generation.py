@@ -1,7 +1,22 @@
 import os
+import re
+import time
+import datetime
+import threading
 import google.generativeai as genai
 import streamlit as st
 from dotenv import load_dotenv
+from src.prompt_utils import RECIPE_PREAMBLE, RECIPE_OUTPUT_CEILING, compile_recipe_request, get_token_budgets, register_preamble, preamble_tokens
+
+MODEL_NAME = 'gemini-1.5-flash-latest'
+PREAMBLE_CACHE_TTL = datetime.timedelta(hours=1)
+# Gemini only caches content of at least this many tokens, and only for models pinned
+# to a version (e.g. gemini-1.5-flash-002), not -latest aliases.
+CONTEXT_CACHE_MIN_TOKENS = 32768
+PINNED_MODEL_VERSION = re.compile(r"-\d{3}$")
+_bound_models = {}
+_bound_models_lock = threading.Lock()
+_bind_locks = {}
 
 def configure_gemini():
     load_dotenv()
@@ -11,56 +26,67 @@ def configure_gemini():
         st.stop()
     try:
         genai.configure(api_key=api_key)
-        model = genai.GenerativeModel(model_name='gemini-1.5-flash-latest')
+        model = genai.GenerativeModel(model_name=MODEL_NAME)
         return model
     except Exception as e:
         st.error(f"🚨 Failed to configure Gemini: {str(e)}")
         st.error("Please ensure your API key is correct and has the Gemini API enabled.")
         st.stop()
 
-def generate_recipe(model, ingredients, diet, cuisine, meal_type, skill_level="Any", total_time=""):
-    prompt = f"""
-    Create a detailed {meal_type.lower()} recipe using primarily these ingredients: {ingredients}.
-
-    Requirements:
-    - Diet: {diet if diet != "None" else "No dietary restrictions"}
-    - Cuisine style: {cuisine if cuisine != "Any" else "Any style is acceptable"}
-    - Cooking skill level: {skill_level if skill_level != "Any" else "Any skill level (make it accessible)"}
-    {'- The total time for the recipe (prep + cook) should not exceed ' + total_time + ' minutes.' if total_time.strip() else ''}
+def _can_cache_preamble(model_name, preamble):
+    return bool(PINNED_MODEL_VERSION.search(model_name)) and preamble_tokens(preamble) >= CONTEXT_CACHE_MIN_TOKENS
 
-    The recipe should include:
-    1. CREATIVE RECIPE NAME (make this appealing and unique)
-    2. A short, enticing DESCRIPTION of the dish (1-2 sentences).
-    3. PREP TIME: (e.g., 15 minutes)
-    4. COOK TIME: (e.g., 30 minutes)
-    5. TOTAL TIME: (Prep + Cook)
-    6. SERVINGS: (e.g., 4 servings)
-    7. INGREDIENTS:
-       - List all ingredients with precise measurements (e.g., 1 cup, 2 tbsp, 100g).
-       - Organize by category if needed (e.g., "For the marinade:", "For the main dish:").
-    8. EQUIPMENT: (Optional: list any special equipment needed, e.g., "9x13 inch baking dish")
-    9. PREPARATION STEPS:
-       - Numbered, clear, concise instructions.
-       - Include cooking temperatures and estimated times for each major step.
-       - Start with preheating oven/preparing pans if necessary.
-    10. SERVING SUGGESTIONS:
-        - How to plate or present the dish.
-        - Recommended side dishes or accompaniments.
-    11. CHEF'S TIPS: (Optional: 1-2 helpful tips, variations, or storage instructions)
+def _fresh_bound_model(key):
+    # Caller holds _bound_models_lock.
+    bound = _bound_models.get(key)
+    if bound and time.monotonic() - bound[1] < PREAMBLE_CACHE_TTL.total_seconds() * 0.9:
+        return bound[0]
+    return None
 
-    Make the recipe easy to follow for home cooks.
-    Be creative and ensure the recipe sounds delicious!
-    The very first line of your response MUST be "1. CREATIVE RECIPE NAME: [Actual Name Here]". Do not add any other text or numbering before this line.
-    For subsequent sections like "2. DESCRIPTION:", "3. PREP TIME:", etc., also ensure they start on a new line with the number and title.
+def bind_preamble(model, preamble):
     """
+    Returns a model that carries preamble as its static instructions, so each request only
+    sends the per-recipe part. Uses Gemini context caching when the counted preamble is large
+    enough to be cached and the model version is pinned, otherwise a system instruction.
+    Binding happens once per model and preamble at a time; bound models are reused until
+    the cache TTL runs out.
+    """
+    model_name = getattr(model, "model_name", MODEL_NAME)
+    key = (model_name, preamble)
+    with _bound_models_lock:
+        bound_model = _fresh_bound_model(key)
+        if bound_model is not None:
+            return bound_model
+        bind_lock = _bind_locks.setdefault(key, threading.Lock())
+    with bind_lock:
+        with _bound_models_lock:
+            bound_model = _fresh_bound_model(key)
+        if bound_model is not None:
+            return bound_model
+        register_preamble(model, preamble)
+        if _can_cache_preamble(model_name, preamble):
+            try:
+                cached = genai.caching.CachedContent.create(model=model_name, system_instruction=preamble, ttl=PREAMBLE_CACHE_TTL)
+                bound_model = genai.GenerativeModel.from_cached_content(cached_content=cached)
+            except Exception:
+                bound_model = None
+        if bound_model is None:
+            bound_model = genai.GenerativeModel(model_name=model_name, system_instruction=preamble)
+        with _bound_models_lock:
+            _bound_models[key] = (bound_model, time.monotonic())
+    return bound_model
+
+def generate_recipe(model, ingredients, diet, cuisine, meal_type, skill_level="Any", total_time="", language="Any (auto-detect)"):
+    request = compile_recipe_request(ingredients, diet, cuisine, meal_type, skill_level, total_time, language)
     try:
-        response = model.generate_content(
-            prompt,
-            generation_config={
-                "temperature": 0.8,
-                "top_p": 0.95,
-                "max_output_tokens": 3500
-            }
+        response = get_token_budgets().generate(
+            bind_preamble(model, RECIPE_PREAMBLE),
+            "recipe",
+            (meal_type, skill_level, language),
+            RECIPE_PREAMBLE,
+            request,
+            {"temperature": 0.8, "top_p": 0.95},
+            RECIPE_OUTPUT_CEILING
         )
         if not response.text:
             if response.prompt_feedback and response.prompt_feedback.block_reason:
@@ -1,13 +1,16 @@
 from googletrans import Translator
 import streamlit as st
 
-def translate_text(text, dest_language_code):
+def request_translation(text, dest_language_code):
+    """Translates text and raises on failure, so callers can decide whether to cache the result."""
     if dest_language_code == 'original' or dest_language_code == 'any':
         return text
     translator = Translator()
+    return translator.translate(text, dest=dest_language_code).text
+
+def translate_text(text, dest_language_code):
     try:
-        translated = translator.translate(text, dest=dest_language_code)
-        return translated.text
+        return request_translation(text, dest_language_code)
     except Exception as e:
         st.warning(f"Translation failed: {e}")
         return text